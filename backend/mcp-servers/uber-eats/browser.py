@@ -1,44 +1,145 @@
-from typing import Awaitable, Callable
-from browser_use import Agent
-from browser_use.browser.session import BrowserSession
-from browser_use.llm.openai.chat import ChatOpenAI
+from __future__ import annotations
+
+import asyncio
+import os
+import string
+from typing import TYPE_CHECKING, Awaitable, Callable
 from dotenv import load_dotenv
 import warnings
 
+# browser_use, the OpenAI client and httpx are imported on first use, so
+# importing this module (e.g. from a freshly spawned worker) stays cheap
+if TYPE_CHECKING:
+    from browser_use.agent.views import AgentHistoryList
+    from browser_use.browser.session import BrowserSession
+    from browser_use.llm.openai.chat import ChatOpenAI
+
 load_dotenv()
 
 warnings.filterwarnings("ignore")
 
-llm = ChatOpenAI(model="gpt-4o")
+# Maximum actions the agent may take per step, and so concurrent requests it can issue
+MAX_ACTIONS_PER_STEP = 20
+
+_llm: ChatOpenAI | None = None
 
-task_template = """
+task_template = string.Template("""
 perform the following task
-{task}
-"""
-
-async def run_browser_agent(task: str, on_step: Callable[[], Awaitable[None]]):
-    """Run the browser-use agent with the specified task."""
-
-    # Create a browser session with Chrome configuration
-    browser_session = BrowserSession(
-        executable_path='/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
-        headless=False,  # Run in visible mode so you can see what's happening
-        disable_security=True,  # Disable security features that might interfere
-    )
-
-    agent = Agent(
-        task=task_template.format(task=task),
-        browser_session=browser_session,
-        llm=llm,
-        register_new_step_callback=on_step,
-        register_done_callback=on_step,
-        max_steps=50,  # Increase max steps
-        max_actions_per_step=20,  # Allow more actions per step
-    )
-
-    result = await agent.run()
-
-    # Stop the browser session
-    await browser_session.stop()
+$task
+""")
+
+# Agent actions whose results are page content rather than a log of what the agent did
+EXTRACT_ACTIONS = {"extract_structured_data", "extract_content"}
+
+# Shared browser session, reused across agent runs so Chrome is only launched once
+_session: BrowserSession | None = None
+_session_lock = asyncio.Lock()
+# Agent runs drive the shared session one at a time
+_run_lock = asyncio.Lock()
+
+def preload():
+    """Import the browser automation stack ahead of the first run."""
+    import browser_use  # noqa: F401
+
+def _get_llm() -> ChatOpenAI:
+    """Return the shared LLM client, creating it on first use."""
+    global _llm
+    if _llm is None:
+        import httpx
+        from browser_use.llm.openai.chat import ChatOpenAI
+
+        # Share one pooled HTTP client across LLM calls so connections are kept alive
+        # and concurrent requests within a step don't wait on each other for a socket
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_ACTIONS_PER_STEP,
+                max_keepalive_connections=MAX_ACTIONS_PER_STEP,
+            )
+        )
+        _llm = ChatOpenAI(model="gpt-4o", http_client=http_client)
+    return _llm
+
+def _extracted_findings(history: AgentHistoryList) -> list[str]:
+    """Return the results of the content extraction actions in an agent's history."""
+    findings = []
+    for item in history.history:
+        if item.model_output is None:
+            continue
+        # An item's results line up with the actions the model asked for in that step
+        for action, result in zip(item.model_output.action, item.result):
+            name = next(iter(action.model_dump(exclude_unset=True)), None)
+            if name in EXTRACT_ACTIONS and result.extracted_content:
+                findings.append(result.extracted_content)
+    return findings
+
+async def _get_session() -> BrowserSession:
+    """Return the shared browser session, starting Chrome on first use."""
+    global _session
+    async with _session_lock:
+        if _session is None:
+            from browser_use.browser.session import BrowserSession
+
+            _session = BrowserSession(
+                executable_path='/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',
+                # Run headless unless DEBUG_BROWSER=1, to watch what's happening
+                headless=os.environ.get("DEBUG_BROWSER") != "1",
+                disable_security=True,  # Disable security features that might interfere
+                args=["--disable-gpu", "--disable-dev-shm-usage", "--no-sandbox"],
+                keep_alive=True,  # Don't let the agent close the browser when it finishes
+            )
+            await _session.start()
+        return _session
+
+async def close_browser():
+    """Stop the shared browser session, if one was started."""
+    global _session
+    async with _session_lock:
+        if _session is not None:
+            await _session.kill()
+            _session = None
+
+async def run_browser_agent(
+    task: str,
+    on_step: Callable[[], Awaitable[None]],
+    on_progress: Callable[[str], Awaitable[None]] | None = None,
+):
+    """Run the browser-use agent with the specified task.
+
+    If given, on_progress is called after each step with the page content the
+    agent has extracted so far, once there is any.
+    """
+    from browser_use import Agent
+
+    async with _run_lock:
+        # Fetched under the lock: a failed run before us may have killed the session
+        browser_session = await _get_session()
+        # Each task gets its own tab instead of a new browser process
+        page = await browser_session.create_new_tab()
+
+        async def step_callback(*args, **kwargs):
+            await on_step(*args, **kwargs)
+            if on_progress is not None:
+                findings = _extracted_findings(agent.state.history)
+                if findings:
+                    await on_progress("\n\n".join(findings))
+
+        agent = Agent(
+            task=task_template.substitute(task=task),
+            browser_session=browser_session,
+            llm=_get_llm(),
+            register_new_step_callback=step_callback,
+            register_done_callback=on_step,
+            max_steps=50,  # Increase max steps
+            max_actions_per_step=MAX_ACTIONS_PER_STEP,  # Allow more actions per step
+        )
+
+        try:
+            result = await agent.run()
+        except BaseException:
+            # A failed, timed out or cancelled run can leave Chrome in any state:
+            # shut it down so it can't leak, and let the next run start a fresh one
+            await close_browser()
+            raise
+        await page.close()
 
     return result.final_result()
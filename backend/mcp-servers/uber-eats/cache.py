@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of completed searches, keyed by the normalized
+(address, food_craving) pair. Shared by the server and the search workers.
+"""
+import hashlib
+import os
+import time
+from pathlib import Path
+import orjson
+
+# Cache directory, sharded as <key[:2]>/<key[2:4]>/<key>.json
+CACHE_DIR = Path(__file__).parent / "search_cache"
+
+# How long a cached search stays fresh, in seconds
+CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", 600))
+
+def cache_key(address: str, food_craving: str) -> str:
+    """Build the cache key for a search."""
+    normalized = f"{address.lower().strip()}|{food_craving.lower().strip()}"
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+def cache_path(key: str) -> Path:
+    """Path of the cache entry for a key."""
+    return CACHE_DIR / key[:2] / key[2:4] / f"{key}.json"
+
+def load(key: str, max_age: float = CACHE_TTL) -> str | None:
+    """Return the cached result for a key, or None if missing or stale."""
+    try:
+        entry = orjson.loads(cache_path(key).read_bytes())
+    except (FileNotFoundError, orjson.JSONDecodeError):
+        return None
+    if time.time() - entry["stored_at"] >= max_age:
+        return None
+    return entry["data"]
+
+def store(key: str, data: str):
+    """Cache a search result."""
+    path = cache_path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file and rename so readers never see a partial entry
+    tmp = path.with_suffix('.json.tmp')
+    tmp.write_bytes(orjson.dumps({"data": data, "stored_at": time.time()}))
+    os.replace(tmp, path)
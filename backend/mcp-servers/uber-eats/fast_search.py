@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Fast path for find_menu_options: query Uber Eats' web API directly over HTTP
+instead of driving a browser agent. It answers with the same item-level results
+as the browser search (dish, price, direct item URL); anything else, including
+any failure (unexpected response, CAPTCHA, timeout), returns None so the caller
+falls back to the browser search.
+"""
+import asyncio
+import json
+import os
+import time
+from urllib.parse import quote
+import aiohttp
+from log import logger
+
+BASE_URL = "https://www.ubereats.com"
+
+# Set FAST_SEARCH=1 to try the HTTP path first. Off by default: the web API is
+# undocumented and its payloads haven't been validated against live responses
+FAST_SEARCH = os.getenv("FAST_SEARCH", "0") == "1"
+
+# Overall time budget for the HTTP path, in seconds
+FAST_SEARCH_TIMEOUT = float(os.getenv("FAST_SEARCH_TIMEOUT", 10))
+
+# After a failure, skip the HTTP path for this long, in seconds
+FAST_SEARCH_BACKOFF = 600
+
+# Number of results to return, matching the browser search
+MAX_RESULTS = 10
+
+# Number of top search results whose menus are searched for matching items
+MAX_STORES = 5
+
+_session: aiohttp.ClientSession | None = None
+_backoff_until = 0.0
+
+def _get_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            base_url=BASE_URL,
+            # Backstop only, try_api bounds the whole search with FAST_SEARCH_TIMEOUT
+            timeout=aiohttp.ClientTimeout(total=FAST_SEARCH_TIMEOUT),
+            # The web API only checks that a CSRF token header is present
+            headers={"x-csrf-token": "x", "content-type": "application/json"},
+        )
+    return _session
+
+async def close():
+    """Close the shared HTTP session."""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+async def _post(path: str, payload: dict, cookies: dict | None = None) -> dict:
+    """POST to a web API endpoint and return its data, raising on any error."""
+    async with _get_session().post(path, json=payload, cookies=cookies) as response:
+        response.raise_for_status()
+        body = await response.json(content_type=None)
+    if body.get("status") != "success":
+        raise ValueError(f"{path} returned status {body.get('status')!r}")
+    return body["data"]
+
+async def _resolve_location(address: str) -> dict:
+    """Resolve a free-form address to the location Uber Eats stores in its uev2.loc cookie."""
+    suggestions = await _post("/_p/api/getLocationAutocompleteV1", {"query": address})
+    if not suggestions:
+        raise ValueError(f"no location found for {address!r}")
+    place = suggestions[0]
+    return await _post("/_p/api/getDeliveryLocationV1", {
+        "placeId": place["id"],
+        "provider": place["provider"],
+        "source": "manual_auto_complete",
+    })
+
+async def _store_items(store: dict, food_craving: str) -> list[dict]:
+    """Return the menu items of a search result store that match the craving."""
+    menu = await _post("/_p/api/getStoreV1", {"storeUuid": store["storeUuid"]})
+    store_url = f"{BASE_URL}/store/{menu['slug']}/{menu['uuid']}"
+    craving = food_craving.lower().strip()
+    items = []
+    for sections in menu["catalogSectionsMap"].values():
+        for section in sections:
+            for item in section["payload"]["standardItemsPayload"]["catalogItems"]:
+                text = f"{item['title']} {item.get('itemDescription') or ''}".lower()
+                price = (item.get("priceTagline") or {}).get("text")
+                if craving not in text or not price:
+                    continue
+                # Item pages are the store page with the item's quick view open
+                modctx = json.dumps({
+                    "storeUuid": menu["uuid"],
+                    "sectionUuid": item["sectionUuid"],
+                    "subsectionUuid": item["subsectionUuid"],
+                    "itemUuid": item["uuid"],
+                })
+                items.append({
+                    "restaurant": menu["title"],
+                    "name": item["title"],
+                    "price": price,
+                    "rating": (store.get("rating") or {}).get("text", "n/a"),
+                    "delivery": ", ".join(m["text"] for m in store.get("meta") or [] if m.get("text")) or "n/a",
+                    "url": f"{store_url}?mod=quickView&modctx={quote(quote(modctx))}",
+                })
+    return items
+
+def _format_results(items: list[dict]) -> str | None:
+    """Format menu items like the browser search's result list."""
+    lines = []
+    for n, item in enumerate(items[:MAX_RESULTS], start=1):
+        lines.append(
+            f"{n}. {item['name']}\n"
+            f"   - Restaurant: {item['restaurant']}\n"
+            f"   - Price: {item['price']}\n"
+            f"   - Rating: {item['rating']}\n"
+            f"   - Delivery time: {item['delivery']}\n"
+            f"   - URL: {item['url']}"
+        )
+    return "\n".join(lines) if lines else None
+
+async def try_api(address: str, food_craving: str) -> str | None:
+    """Search restaurants for a craving at an address over HTTP.
+
+    Returns the formatted results, or None if the HTTP path is disabled,
+    backing off after a recent failure, or didn't find matching menu items.
+    """
+    global _backoff_until
+    if not FAST_SEARCH or time.monotonic() < _backoff_until:
+        return None
+
+    try:
+        async with asyncio.timeout(FAST_SEARCH_TIMEOUT):
+            location = await _resolve_location(address)
+            data = await _post(
+                "/_p/api/getSearchFeedV1",
+                {"userQuery": food_craving, "searchType": "GLOBAL_SEARCH", "vertical": "ALL"},
+                cookies={"uev2.loc": quote(json.dumps(location))},
+            )
+            stores = [item["store"] for item in data.get("feedItems") or [] if item.get("store")][:MAX_STORES]
+            menus = await asyncio.gather(*(_store_items(store, food_craving) for store in stores), return_exceptions=True)
+            if stores and all(isinstance(menu, BaseException) for menu in menus):
+                raise menus[0]
+            result = _format_results([item for menu in menus if not isinstance(menu, BaseException) for item in menu])
+    except Exception as e:
+        logger.warning(f"⚠️ Fast search failed, falling back to the browser: {e!r}")
+        _backoff_until = time.monotonic() + FAST_SEARCH_BACKOFF
+        return None
+
+    if result is None:
+        logger.info(f"🔎 Fast search found no matching items for '{food_craving}' at '{address}', falling back to the browser")
+    return result
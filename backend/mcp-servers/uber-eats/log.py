@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Logging shared by the server and the search workers.
+Records are handed to a background thread through a queue, so logging from
+async code never blocks on a write to the terminal.
+"""
+import atexit
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+logger = logging.getLogger("uber_eats")
+
+def _setup():
+    """Route the logger through a queue to a listener thread writing to stderr."""
+    log_queue = queue.Queue(-1)
+    # stderr, since the server's stdout carries the MCP stdio transport
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s [%(processName)s] %(message)s"))
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(os.getenv("UBER_EATS_LOG_LEVEL", "INFO").upper())
+    logger.propagate = False
+
+_setup()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Persistent storage of search results, shared by the server and the search workers.
+"""
+import os
+import time
+from pathlib import Path
+from datetime import datetime
+import orjson
+from log import logger
+
+# Persistent storage directory
+RESULTS_DIR = Path(__file__).parent / "search_results"
+RESULTS_DIR.mkdir(exist_ok=True)
+
+def result_path(request_id: str) -> Path:
+    """Path of a request's result file, sharded as <id[:2]>/<id[2:4]>/<id>.json
+    so no single directory grows without bound."""
+    return RESULTS_DIR / request_id[:2] / request_id[2:4] / f"{request_id}.json"
+
+def encode_result(request_id: str, result: str, status: str | None = None) -> bytes:
+    """Serialize a search result record.
+
+    The status is derived from the result unless given explicitly.
+    """
+    if status is None:
+        status = "completed" if not result.startswith("Error") and not result.startswith("Search was cancelled") else "error"
+    data = {
+        "request_id": request_id,
+        "result": result,
+        "timestamp": datetime.now().isoformat(),
+        "status": status
+    }
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+def save_result_to_disk(request_id: str, result: str, status: str | None = None):
+    """Save search result to disk as JSON file."""
+    try:
+        result_file = result_path(request_id)
+        result_file.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file and rename so readers never see a half-written result
+        tmp = result_file.with_suffix('.json.tmp')
+        tmp.write_bytes(encode_result(request_id, result, status))
+        os.replace(tmp, result_file)
+        logger.info(f"✅ Saved result to disk: {result_file}")
+    except Exception as e:
+        logger.error(f"❌ Error saving result to disk: {e}")
+
+def collect_stale_files(root: Path, max_age: float) -> int:
+    """Delete files under root last modified more than max_age seconds ago,
+    and empty shard directories that haven't changed for as long.
+
+    Returns the number of files removed.
+    """
+    return _collect_stale_files(root, time.time() - max_age)
+
+def _collect_stale_files(directory: Path | str, cutoff: float) -> int:
+    """Delete files older than cutoff below directory, depth first."""
+    removed = 0
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        removed += _collect_stale_files(entry.path, cutoff)
+                        # A recently modified directory may have just been created
+                        # by a writer that is about to put its file in it
+                        if os.stat(entry.path).st_mtime < cutoff:
+                            try:
+                                os.rmdir(entry.path)
+                            except OSError:
+                                # Not empty
+                                pass
+                    elif entry.stat(follow_symlinks=False).st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    # Replaced or removed while we were looking at it
+                    continue
+    except FileNotFoundError:
+        pass
+    return removed
@@ -3,73 +3,100 @@
 Standalone worker script for running browser automation searches.
 This runs as an independent process and saves results to disk.
 """
+import os
 import sys
-import json
 import asyncio
-from pathlib import Path
-from datetime import datetime
-from browser import run_browser_agent
+import orjson
+from browser import run_browser_agent, close_browser
+import cache
+from results import save_result_to_disk
+from log import logger
 
-# Results directory
-RESULTS_DIR = Path(__file__).parent / "search_results"
-RESULTS_DIR.mkdir(exist_ok=True)
+# Upper bound on a single search, in seconds
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", 180))
 
-def save_result_to_disk(request_id: str, result: str):
-    """Save search result to disk as JSON file."""
-    try:
-        result_file = RESULTS_DIR / f"{request_id}.json"
-        data = {
-            "request_id": request_id,
-            "result": result,
-            "timestamp": datetime.now().isoformat(),
-            "status": "completed" if not result.startswith("Error") and not result.startswith("Search was cancelled") else "error"
-        }
-        with open(result_file, 'w') as f:
-            json.dump(data, f, indent=2)
-        print(f"✅ Saved result to disk: {result_file}", flush=True)
-    except Exception as e:
-        print(f"❌ Error saving result to disk: {e}", flush=True)
+# Minimum time between partial result snapshots, in seconds
+PARTIAL_RESULT_INTERVAL = 5.0
 
-async def run_search(request_id: str, task: str):
-    """Run the browser search and save results."""
+async def run_search(request_id: str, task: str, cache_key: str | None = None):
+    """Run the browser search, save results and cache them under cache_key."""
     try:
         step_count = 0
 
         async def step_handler(*args, **kwargs):
             nonlocal step_count
             step_count += 1
-            print(f"📍 Step {step_count} completed", flush=True)
+            logger.debug(f"📍 Step {step_count} completed")
+
+        last_partial = float("-inf")
 
-        print(f"🔍 Starting browser automation for request {request_id}", flush=True)
-        result = await run_browser_agent(task=task, on_step=step_handler)
+        async def progress_handler(findings: str):
+            # Persist what the agent has found so far, at most every few seconds.
+            # The write is synchronous, so it can never land after the final result.
+            nonlocal last_partial
+            now = asyncio.get_running_loop().time()
+            if now - last_partial < PARTIAL_RESULT_INTERVAL:
+                return
+            last_partial = now
+            save_result_to_disk(request_id, findings, status="partial")
+
+        logger.info(f"🔍 Starting browser automation for request {request_id}")
+        result = await asyncio.wait_for(
+            run_browser_agent(task=task, on_step=step_handler, on_progress=progress_handler),
+            timeout=SEARCH_TIMEOUT,
+        )
 
         # Save to disk
         save_result_to_disk(request_id, result)
+        if cache_key and result:
+            cache.store(cache_key, result)
+
+        logger.info(f"✅ Search completed for request {request_id}")
+        logger.info(f"📊 Results:\n{result[:200]}...")
 
-        print(f"✅ Search completed for request {request_id}", flush=True)
-        print(f"📊 Results:\n{result[:200]}...", flush=True)
+    except asyncio.TimeoutError:
+        error_msg = f"Search was cancelled after {SEARCH_TIMEOUT:.0f} seconds. Please try again with a simpler search or address."
+        save_result_to_disk(request_id, error_msg)
+        logger.warning(f"⏱️ Search timed out for request {request_id}")
 
     except asyncio.CancelledError:
         error_msg = "Search was cancelled due to timeout. Please try again with a simpler search or address."
         save_result_to_disk(request_id, error_msg)
-        print(f"⚠️ Search cancelled for request {request_id}", flush=True)
+        logger.warning(f"⚠️ Search cancelled for request {request_id}")
 
     except Exception as e:
         error_msg = f"Error: {str(e)}"
         save_result_to_disk(request_id, error_msg)
-        print(f"❌ Search error for request {request_id}: {str(e)}", flush=True)
+        logger.error(f"❌ Search error for request {request_id}: {str(e)}")
+
+async def main(request_id: str, task: str, cache_key: str | None = None):
+    """Run a single search, then shut the browser down."""
+    try:
+        await run_search(request_id, task, cache_key)
+    finally:
+        await close_browser()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: search_worker.py <request_id> <task_json>", flush=True)
+    # The job arrives on stdin as {"request_id": ..., "task": ..., "cache_key": ...}
+    try:
+        payload = orjson.loads(sys.stdin.buffer.read())
+        request_id = payload["request_id"]
+        task = payload["task"]
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        logger.error('Usage: echo \'{"request_id": ..., "task": ...}\' | search_worker.py')
         sys.exit(1)
+    cache_key = payload.get("cache_key")
 
-    request_id = sys.argv[1]
-    task = sys.argv[2]
+    logger.info(f"🚀 Worker started for request {request_id}")
 
-    print(f"🚀 Worker started for request {request_id}", flush=True)
+    # Use the libuv-based event loop when it's available
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
 
     # Run the search
-    asyncio.run(run_search(request_id, task))
+    asyncio.run(main(request_id, task, cache_key))
 
-    print(f"🏁 Worker finished for request {request_id}", flush=True)
+    logger.info(f"🏁 Worker finished for request {request_id}")
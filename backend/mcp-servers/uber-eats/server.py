@@ -1,76 +1,88 @@
 #!/usr/bin/env python3
 import asyncio
-import json
-import subprocess
+import os
+import string
 import sys
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from datetime import datetime
+import aiofiles
+import aiofiles.os
+import orjson
+import watchfiles
+from cachetools import LRUCache
 from dotenv import load_dotenv
 from mcp.server.fastmcp import FastMCP, Context
+from browser import run_browser_agent, close_browser
+import cache
+import fast_search
+import worker_pool
+from results import RESULTS_DIR, collect_stale_files, encode_result, result_path
+from results import save_result_to_disk as save_result_to_disk_sync
+from log import logger
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize FastMCP server
-mcp = FastMCP("uber_eats")
+# Number of long-lived search workers (0 spawns a one-shot worker per search)
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
 
-# Persistent storage directory
-RESULTS_DIR = Path(__file__).parent / "search_results"
-RESULTS_DIR.mkdir(exist_ok=True)
+# Result and cache files older than this are deleted, in hours
+RESULT_TTL_HOURS = float(os.getenv("RESULT_TTL_HOURS", 24))
 
-# In-memory storage for search results (kept for backward compatibility)
-search_results = {}
+# How often stale files are collected, in seconds (0 disables collection)
+RESULT_GC_INTERVAL_S = float(os.getenv("RESULT_GC_INTERVAL_S", 300))
 
-# Helper functions for persistent storage
-def save_result_to_disk(request_id: str, result: str):
-    """Save search result to disk as JSON file."""
-    try:
-        result_file = RESULTS_DIR / f"{request_id}.json"
-        data = {
-            "request_id": request_id,
-            "result": result,
-            "timestamp": datetime.now().isoformat(),
-            "status": "completed" if not result.startswith("Error") and not result.startswith("Search was cancelled") else "error"
-        }
-        with open(result_file, 'w') as f:
-            json.dump(data, f, indent=2)
-        print(f"✅ Saved result to disk: {result_file}")
-    except Exception as e:
-        print(f"❌ Error saving result to disk: {e}")
+# How long a waiting read of search results blocks, in seconds
+RESULT_WAIT_TIMEOUT = float(os.getenv("RESULT_WAIT_TIMEOUT", 180))
 
-def load_result_from_disk(request_id: str) -> str | None:
-    """Load search result from disk."""
+# How long an in-flight search can absorb identical searches, in seconds
+INFLIGHT_TIMEOUT = 600
+
+async def gc_loop():
+    """Periodically delete stale result and cache files."""
+    while True:
+        try:
+            removed = 0
+            for root in (RESULTS_DIR, cache.CACHE_DIR):
+                removed += await asyncio.to_thread(collect_stale_files, root, RESULT_TTL_HOURS * 3600)
+            if removed:
+                logger.info(f"🧹 Removed {removed} stale result files")
+        except Exception as e:
+            logger.error(f"❌ Error collecting stale result files: {e}")
+        await asyncio.sleep(RESULT_GC_INTERVAL_S)
+
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    """Start the search worker pool and result GC, and release them, the shared browser session and HTTP session on shutdown."""
+    if SEARCH_WORKERS > 0:
+        worker_pool.start(n=SEARCH_WORKERS)
+    gc_task = asyncio.create_task(gc_loop()) if RESULT_GC_INTERVAL_S > 0 else None
     try:
-        result_file = RESULTS_DIR / f"{request_id}.json"
-        if result_file.exists():
-            with open(result_file, 'r') as f:
-                data = json.load(f)
-            print(f"✅ Loaded result from disk: {result_file}")
-            return data.get("result")
-        return None
-    except Exception as e:
-        print(f"❌ Error loading result from disk: {e}")
-        return None
+        yield
+    finally:
+        if gc_task is not None:
+            gc_task.cancel()
+        await asyncio.to_thread(worker_pool.stop)
+        await close_browser()
+        await fast_search.close()
 
-@mcp.tool()
-async def find_menu_options(address: str, food_craving: str, context: Context) -> str:
-    """Search Uber Eats for food options based on delivery address and what you're craving.
+# Initialize FastMCP server
+mcp = FastMCP("uber_eats", lifespan=lifespan)
 
-    Args:
-        address: Delivery address (e.g., "123 Main St, New York, NY" or "Stockholm, Sweden")
-        food_craving: What food you're craving (e.g., "pizza", "tacos", "sushi")
-    """
+# In-memory storage for search results (kept for backward compatibility)
+search_results = {}
 
-    # Create the search task
-    task = f"""
+# Browser agent instructions for a search
+SEARCH_TASK_TEMPLATE = string.Template("""
 0. Start by going to: https://www.ubereats.com/
 1. Look for the address/location input field (usually at the top of the page)
 2. Click on the address field and clear any existing text
-3. Type "{address}" and wait 2 seconds for autocomplete suggestions
+3. Type "$address" and wait 2 seconds for autocomplete suggestions
 4. Press Enter or click the first suggestion to set the delivery location
 5. Wait 3 seconds for the page to load with restaurants for this location
 6. Find the search bar for food/restaurants (usually near the top)
-7. Type "{food_craving}" in the search bar and press Enter
+7. Type "$food_craving" in the search bar and press Enter
 8. Wait 3 seconds for search results to load
 9. Scroll down to see more options if needed
 10. Collect the following information for the top 10 items/dishes you find:
@@ -81,31 +93,215 @@ async def find_menu_options(address: str, food_craving: str, context: Context) -
     - Delivery time estimate (if visible)
     - Direct URL to the item
 11. Format the results as a clear list with all details for each of the 10 options
-"""
+""")
+
+# Browser agent instructions for an order
+ORDER_TASK_TEMPLATE = string.Template("""
+1. Go to $item_url
+2. Click "Add to order"
+3. Wait 3 seconds
+4. Click "Go to checkout"
+5. If there are upsell modals, click "Skip"
+6. Click "Place order"
+""")
+
+# Statuses of searches that haven't finished yet
+PENDING_STATUSES = ("running", "partial")
+
+# Searches currently running, keyed by cache key -> request ID
+_inflight: dict[str, str] = {}
+_inflight_watchers = set()
+
+# Parsed result records read from disk, keyed by request ID -> (mtime_ns, record)
+result_cache = LRUCache(maxsize=1024)
+
+# Helper functions for persistent storage. They go through aiofiles so disk
+# access never blocks the event loop serving other MCP requests.
+async def save_result_to_disk(request_id: str, result: str, status: str | None = None):
+    """Save search result to disk as JSON file."""
+    try:
+        result_file = result_path(request_id)
+        await aiofiles.os.makedirs(result_file.parent, exist_ok=True)
+        # Write to a temp file and rename so readers never see a half-written result
+        tmp = result_file.with_suffix('.json.tmp')
+        async with aiofiles.open(tmp, 'wb') as f:
+            await f.write(encode_result(request_id, result, status))
+        await aiofiles.os.replace(tmp, result_file)
+        logger.info(f"✅ Saved result to disk: {result_file}")
+    except Exception as e:
+        logger.error(f"❌ Error saving result to disk: {e}")
+
+def result_etag(st: os.stat_result) -> str:
+    """Build the etag of a result file from its stat, without reading it."""
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+async def load_record_from_disk(request_id: str, st: os.stat_result | None = None) -> dict | None:
+    """Load the full search result record (result, status, timestamp) from disk.
+
+    Pass the file's stat if the caller already has it, to save a syscall.
+    """
+    try:
+        result_file = result_path(request_id)
+        if st is None:
+            st = await aiofiles.os.stat(result_file)
+        # Skip the read and parse while the file hasn't changed
+        mtime_ns = st.st_mtime_ns
+        cached = result_cache.get(request_id)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        async with aiofiles.open(result_file, 'rb') as f:
+            data = orjson.loads(await f.read())
+        logger.info(f"✅ Loaded result from disk: {result_file}")
+        result_cache[request_id] = (mtime_ns, data)
+        return data
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"❌ Error loading result from disk: {e}")
+        return None
+
+def format_record(data: dict) -> str:
+    """Render a result record for clients, flagging partial results."""
+    if data.get("status") == "partial":
+        return f"Partial results (search still running):\n\n{data.get('result')}"
+    return data.get("result")
+
+async def await_result(request_id: str, timeout: float = RESULT_WAIT_TIMEOUT) -> dict | None:
+    """Wait for a search to finish and return its record.
+
+    Watches the results directory instead of polling. Returns the latest record,
+    which may still be running if the timeout expires, or None for unknown requests.
+    """
+    data = await load_record_from_disk(request_id)
+    if data is None or data.get("status") not in PENDING_STATUSES:
+        return data
+
+    result_file = result_path(request_id)
+    target = result_file.name
+    try:
+        async with asyncio.timeout(timeout):
+            # Watch only this request's shard directory (it exists, since the
+            # record above was read from it): a recursive watch of the results
+            # tree costs one inotify watch per shard directory
+            async for _ in watchfiles.awatch(
+                result_file.parent,
+                recursive=False,
+                watch_filter=lambda change, path: os.path.basename(path) == target,
+                # Wake up every few seconds anyway, in case the final write
+                # landed before the watcher was set up
+                rust_timeout=5000,
+                yield_on_timeout=True,
+            ):
+                data = await load_record_from_disk(request_id)
+                if data is not None and data.get("status") not in PENDING_STATUSES:
+                    break
+    except TimeoutError:
+        pass
+    return data
+
+@mcp.tool()
+async def find_menu_options(address: str, food_craving: str, context: Context) -> str:
+    """Search Uber Eats for food options based on delivery address and what you're craving.
+
+    Args:
+        address: Delivery address (e.g., "123 Main St, New York, NY" or "Stockholm, Sweden")
+        food_craving: What food you're craving (e.g., "pizza", "tacos", "sushi")
+    """
+
+    # Results are stored under a fresh UUID rather than the JSON-RPC request ID,
+    # which repeats across clients and server restarts
+    request_id = uuid.uuid4().hex
+
+    # Serve a recent identical search straight from the cache
+    key = cache.cache_key(address, food_craving)
+    cached = await asyncio.to_thread(cache.load, key)
+    if cached is not None:
+        logger.info(f"⚡ Cache hit for request {request_id}")
+        search_results[request_id] = cached
+        await save_result_to_disk(request_id, cached)
+        return f"Found recent results for '{food_craving}' at '{address}' (resource://search_results/{request_id}):\n\n{cached}"
+
+    # Point identical concurrent searches at the one already running
+    existing = _inflight.get(key)
+    if existing is not None:
+        logger.info(f"🔁 Joining in-flight search {existing} for request {request_id}")
+        return f"The same search for '{food_craving}' at '{address}' is already running. Results will be available in 2-3 minutes at resource://search_results/{existing}"
+    _inflight[key] = request_id
+
+    # Until the watcher that releases the key is running, any failure or
+    # cancellation has to release it here, or identical searches would keep
+    # joining a search that never started
+    try:
+        # Store initial status before a worker can pick the search up
+        initial_status = f"Search for '{food_craving}' at '{address}' is running. Check back in 2-3 minutes for results."
+        search_results[request_id] = initial_status
+        await save_result_to_disk(request_id, initial_status, status="running")
+
+        # Try the direct HTTP search before paying for a browser agent run
+        result = await fast_search.try_api(address, food_craving)
+        if result is not None:
+            logger.info(f"⚡ Fast search answered request {request_id}")
+            search_results[request_id] = result
+            await save_result_to_disk(request_id, result)
+            del _inflight[key]
+            await asyncio.to_thread(cache.store, key, result)
+            return f"Found results for '{food_craving}' at '{address}' (resource://search_results/{request_id}):\n\n{result}"
+
+        # Create the search task
+        task = SEARCH_TASK_TEMPLATE.substitute(address=address, food_craving=food_craving)
+
+        if worker_pool.is_running():
+            # Hand the search to a warm worker from the pool
+            worker_pool.submit(request_id, task, key)
+            logger.info(f"📥 Queued search for request {request_id}")
+        else:
+            # The pool is disabled, or all of its workers have died
+            await spawn_worker(request_id, task, key)
+
+        watcher = asyncio.create_task(release_inflight(key, request_id))
+        _inflight_watchers.add(watcher)
+        watcher.add_done_callback(_inflight_watchers.discard)
+    except BaseException:
+        if _inflight.get(key) == request_id:
+            del _inflight[key]
+            save_result_to_disk_sync(request_id, "Error: the search could not be started. Please try again.")
+        raise
+
+    await context.info(f"Search for '{food_craving}' at '{address}' started in background")
+
+    return f"Search started! A worker is running the browser automation. Results will be available in 2-3 minutes at resource://search_results/{request_id}"
+
+async def release_inflight(key: str, request_id: str):
+    """Stop routing identical searches to a request once it has finished."""
+    try:
+        await await_result(request_id, timeout=INFLIGHT_TIMEOUT)
+    finally:
+        if _inflight.get(key) == request_id:
+            del _inflight[key]
 
-    # Spawn independent worker process for the search
+async def spawn_worker(request_id: str, task: str, key: str):
+    """Spawn a one-shot worker process for a search (used when the pool is disabled or down)."""
     worker_script = Path(__file__).parent / "search_worker.py"
     python_exe = sys.executable
 
-    print(f"🚀 Spawning worker process for request {context.request_id}")
+    logger.info(f"🚀 Spawning worker process for request {request_id}")
 
-    # Start the worker process in the background (detached)
-    process = subprocess.Popen(
-        [python_exe, str(worker_script), context.request_id, task],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+    # Start the worker process in the background (detached). Output goes to
+    # DEVNULL: nothing reads it, and an unread PIPE can fill up and block the child.
+    process = await asyncio.create_subprocess_exec(
+        python_exe, str(worker_script),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.DEVNULL,
         start_new_session=True  # Detach from parent process
     )
 
-    print(f"✅ Worker process started with PID {process.pid}")
-    await context.info(f"Search for '{food_craving}' at '{address}' started in background")
-
-    # Store initial status
-    initial_status = f"Search for '{food_craving}' at '{address}' is running. Check back in 2-3 minutes for results."
-    search_results[context.request_id] = initial_status
-    save_result_to_disk(context.request_id, initial_status)
+    # Hand over the job on stdin rather than argv, which is size-limited and visible in ps
+    process.stdin.write(orjson.dumps({"request_id": request_id, "task": task, "cache_key": key}))
+    await process.stdin.drain()
+    process.stdin.close()
 
-    return f"Search started! Worker process (PID {process.pid}) is running the browser automation. Results will be available in 2-3 minutes at resource://search_results/{context.request_id}"
+    logger.info(f"✅ Worker process started with PID {process.pid}")
 
 @mcp.resource(uri="resource://search_results/{request_id}")
 async def get_search_results(request_id: str) -> str:
@@ -115,20 +311,63 @@ async def get_search_results(request_id: str) -> str:
         request_id: The ID of the request to get the search results for
     """
     # First, try to load from disk (persistent storage)
-    disk_result = load_result_from_disk(request_id)
-    if disk_result is not None:
-        print(f"📂 Retrieved result from disk for request {request_id}")
-        return disk_result
+    data = await load_record_from_disk(request_id)
+    if data is not None:
+        logger.info(f"📂 Retrieved result from disk for request {request_id}")
+        return format_record(data)
 
     # Fall back to in-memory storage
     if request_id in search_results:
-        print(f"💾 Retrieved result from memory for request {request_id}")
+        logger.info(f"💾 Retrieved result from memory for request {request_id}")
         return search_results[request_id]
 
     # No results found anywhere
-    print(f"❌ No results found for request {request_id}")
+    logger.error(f"❌ No results found for request {request_id}")
     return f"No search results found for request ID: {request_id}"
 
+@mcp.resource(uri="resource://search_results/{request_id}/wait")
+async def wait_for_search_results(request_id: str) -> str:
+    """Get the search results for a given request ID, waiting for the search to finish first.
+
+    Args:
+        request_id: The ID of the request to get the search results for
+    """
+    data = await await_result(request_id)
+    if data is not None:
+        return format_record(data)
+    return await get_search_results(request_id)
+
+@mcp.resource(uri="resource://search_results/{request_id}/if-none-match/{etag}")
+async def get_search_results_if_changed(request_id: str, etag: str) -> str:
+    """Get the search results for a given request ID, unless they are unchanged.
+
+    Returns an empty string when `etag` matches the stored result. Otherwise
+    returns JSON with the current `etag`, `status` and `result`; pass any
+    placeholder (e.g. "0") as the etag on the first poll.
+
+    Args:
+        request_id: The ID of the request to get the search results for
+        etag: The etag returned by the previous poll
+    """
+    try:
+        st = await aiofiles.os.stat(result_path(request_id))
+    except FileNotFoundError:
+        return orjson.dumps({
+            "etag": None,
+            "status": "not_found",
+            "result": f"No search results found for request ID: {request_id}",
+        }).decode()
+
+    # Unchanged since the client's last poll: skip reading and re-sending it
+    current = result_etag(st)
+    if current == etag:
+        return ""
+
+    data = await load_record_from_disk(request_id, st)
+    if data is None:
+        return orjson.dumps({"etag": None, "status": "error", "result": f"Could not read results for request ID: {request_id}"}).decode()
+    return orjson.dumps({"etag": current, "status": data.get("status"), "result": data.get("result")}).decode()
+
 @mcp.tool()
 async def order_food(item_url: str, item_name: str, context: Context) -> str:
     """Order food from a restaurant.
@@ -138,14 +377,7 @@ async def order_food(item_url: str, item_name: str, context: Context) -> str:
         item_name: Name of the item to order
     """
     
-    task = f"""
-1. Go to {item_url}
-2. Click "Add to order"
-3. Wait 3 seconds
-4. Click "Go to checkout"
-5. If there are upsell modals, click "Skip"
-6. Click "Place order"
-"""
+    task = ORDER_TASK_TEMPLATE.substitute(item_url=item_url)
     
     # Start the background task for ordering
     asyncio.create_task(
@@ -178,4 +410,11 @@ async def perform_order(restaurant_url: str, item_name: str, task: str, context:
         return error_msg
 
 if __name__ == "__main__":
-    mcp.run(transport='stdio') 
+    # Use the libuv-based event loop when it's available
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+
+    mcp.run(transport='stdio')
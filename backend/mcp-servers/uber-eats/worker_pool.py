@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Pool of long-lived search worker processes.
+Each worker keeps Python, browser_use and Chrome warm between searches and
+pulls (request_id, task, cache_key) jobs from a shared queue.
+"""
+import asyncio
+import multiprocessing
+import signal
+import sys
+import time
+from queue import Empty
+from log import logger
+from results import save_result_to_disk
+
+_ctx = multiprocessing.get_context("spawn")
+_queue = None
+_workers = []
+
+# Recorded for jobs that never ran because the pool shut down
+SHUTDOWN_MESSAGE = "Search was cancelled because the server shut down. Please try again."
+
+async def _serve(queue):
+    """Run queued searches one at a time until a None sentinel arrives, the
+    server process is gone, or SIGTERM is received."""
+    from browser import close_browser, preload
+    from search_worker import run_search
+
+    loop = asyncio.get_running_loop()
+    parent = multiprocessing.parent_process()
+    stopping = asyncio.Event()
+    current = None
+
+    def handle_sigterm():
+        # Cancel the running search so the browser still gets closed below
+        stopping.set()
+        if current is not None:
+            current.cancel()
+
+    loop.add_signal_handler(signal.SIGTERM, handle_sigterm)
+
+    try:
+        # Pay for the browser automation imports now rather than on the first search.
+        # A failure here is left for the searches themselves to report
+        try:
+            await loop.run_in_executor(None, preload)
+        except Exception as e:
+            logger.error(f"❌ Failed to preload the browser automation stack: {e!r}")
+        while not stopping.is_set() and parent.is_alive():
+            try:
+                job = await loop.run_in_executor(None, queue.get, True, 1.0)
+            except Empty:
+                continue
+            if job is None:
+                break
+            if stopping.is_set():
+                save_result_to_disk(job[0], SHUTDOWN_MESSAGE)
+                break
+            current = asyncio.create_task(run_search(*job))
+            try:
+                await current
+            except asyncio.CancelledError:
+                pass
+            finally:
+                current = None
+            if stopping.is_set():
+                save_result_to_disk(job[0], SHUTDOWN_MESSAGE)
+    finally:
+        await close_browser()
+
+def _worker_main(queue):
+    """Entry point of a pool process."""
+    # The parent's stdout is the MCP stdio transport, keep worker output off it
+    sys.stdout = sys.stderr
+    # Use the libuv-based event loop when it's available
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    asyncio.run(_serve(queue))
+
+def start(n: int):
+    """Start n worker processes. Does nothing if the pool is already running."""
+    global _queue
+    if _workers:
+        return
+    _queue = _ctx.Queue()
+    for i in range(n):
+        _workers.append(_spawn(i))
+    logger.info(f"✅ Started {n} search workers")
+
+def _spawn(i: int):
+    """Start the pool process in slot i."""
+    process = _ctx.Process(
+        target=_worker_main,
+        args=(_queue,),
+        name=f"search-worker-{i}",
+        daemon=True,
+    )
+    process.start()
+    return process
+
+def _replace_dead_workers():
+    """Restart pool processes that have exited, e.g. after a crash."""
+    for i, process in enumerate(_workers):
+        if not process.is_alive():
+            logger.warning(f"⚠️ {process.name} exited with code {process.exitcode}, restarting it")
+            _workers[i] = _spawn(i)
+
+def is_running() -> bool:
+    """Whether the pool has been started and has a live worker to take searches."""
+    return any(process.is_alive() for process in _workers)
+
+def submit(request_id: str, task: str, cache_key: str | None = None):
+    """Queue a search for the next free worker, restarting any that died."""
+    _replace_dead_workers()
+    _queue.put((request_id, task, cache_key))
+
+def stop(timeout: float = 10.0):
+    """Stop the pool.
+
+    Jobs still waiting in the queue are recorded as cancelled. Workers get a
+    sentinel to exit after their current search; those still busy after the
+    timeout all get SIGTERM at once, which cancels the search and closes their
+    browser, and any left after another timeout are killed.
+    """
+    if not _workers:
+        return
+
+    while True:
+        try:
+            job = _queue.get_nowait()
+        except Empty:
+            break
+        if job is not None:
+            save_result_to_disk(job[0], SHUTDOWN_MESSAGE)
+
+    for _ in _workers:
+        _queue.put(None)
+    # Workers are joined against one shared deadline per phase, so shutdown
+    # takes at most twice the timeout however many of them are busy
+    _join_all(timeout)
+    for process in _workers:
+        if process.is_alive():
+            process.terminate()
+    _join_all(timeout)
+    for process in _workers:
+        if process.is_alive():
+            process.kill()
+            process.join()
+    _workers.clear()
+
+def _join_all(timeout: float):
+    """Wait until every worker has exited or timeout seconds have passed."""
+    deadline = time.monotonic() + timeout
+    for process in _workers:
+        process.join(max(0.0, deadline - time.monotonic()))